@@ -6,6 +6,9 @@ import re
 import sqlite3
 import uuid
 import datetime
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from flask import Flask, render_template, request, jsonify, send_from_directory, abort
 from werkzeug.utils import secure_filename
@@ -64,6 +67,8 @@ app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'outputs'
 app.config['FONT_FOLDER'] = 'fonts'
 app.config['MAX_CONTENT_LENGTH'] = 1024 * 1024 * 1024  # 1GB limit
+app.config['BATCH_MAX_VIDEOS'] = 50
+app.config['BATCH_WORKERS'] = 4  # Concurrent batch downloads across all batches
 
 @app.errorhandler(413)
 def request_entity_too_large(error):
@@ -93,16 +98,38 @@ except Exception as e:
 
 # Database setup
 DB_FILE = 'database.db'
+DB_WRITE_TIMEOUT = 30  # Seconds to wait on a locked database
 def init_db():
     conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS jobs
                  (id TEXT PRIMARY KEY, filename TEXT, status TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS batches
+                 (id TEXT PRIMARY KEY, status TEXT, total INTEGER, error TEXT,
+                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS batch_items
+                 (batch_id TEXT, position INTEGER, url TEXT, job_id TEXT, status TEXT, error TEXT,
+                  PRIMARY KEY (batch_id, position))''')
+    # Databases created before batches had an error column
+    c.execute("PRAGMA table_info(batches)")
+    if 'error' not in [row[1] for row in c.fetchall()]:
+        c.execute("ALTER TABLE batches ADD COLUMN error TEXT")
+
+    # Assumes a single gunicorn worker (see Dockerfile): batches run on its
+    # background threads, so anything still in flight when it (re)starts was
+    # interrupted and will never finish
+    c.execute("UPDATE batch_items SET status = 'failed', error = 'Interrupted by server restart' "
+              "WHERE status IN ('queued', 'downloading', 'processing')")
+    c.execute("UPDATE batches SET status = 'failed', error = 'Interrupted by server restart' "
+              "WHERE status = 'processing'")
+    c.execute("UPDATE jobs SET status = 'failed' WHERE status = 'processing'")
     conn.commit()
     conn.close()
 init_db()
 
 # Load Whisper
+# Whisper is not thread-safe; every transcription goes through this lock
+model_lock = threading.Lock()
 try:
     model = whisper.load_model("base")
 except Exception as e:
@@ -357,31 +384,37 @@ class ContentPDF(FPDF):
         self.multi_cell(0, 6, self.sanitize_text(content))
         self.ln(5)
 
+# Shared yt-dlp options
+# Added user-agent spoofing to avoid 403 errors
+YDL_BASE_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'nocheckcertificate': True,
+    'force_ipv4': True,  # FORCE IPv4 to fix DNS issues in container
+    # SPOOFING: Pretend to be Android YouTube App / Browser
+    'extractor_args': {
+        'youtube': {
+            'player_client': ['android', 'web'],
+        }
+    },
+    'http_headers': {
+        'User-Agent': 'Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Mobile Safari/537.36',
+        'Accept-Language': 'en-US,en;q=0.9',
+    }
+}
+
 def download_from_url(url):
     """Downloads video from URL using yt-dlp with anti-blocking features."""
     job_id = str(uuid.uuid4())
     
     # Configure yt-dlp to download video (for screenshots)
     # Using 'best[ext=mp4]' to ensure video track exists for MoviePy
-    # Added user-agent spoofing to avoid 403 errors
     ydl_opts = {
+        **YDL_BASE_OPTS,
         'format': 'best[ext=mp4]/best',
         'outtmpl': os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_%(title)s.%(ext)s"),
-        'quiet': True,
-        'no_warnings': True,
         'restrictfilenames': True,
-        'nocheckcertificate': True,
-        'force_ipv4': True,  # FORCE IPv4 to fix DNS issues in container
-        # SPOOFING: Pretend to be Android YouTube App / Browser
-        'extractor_args': {
-            'youtube': {
-                'player_client': ['android', 'web'],
-            }
-        },
-        'http_headers': {
-            'User-Agent': 'Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Mobile Safari/537.36',
-            'Accept-Language': 'en-US,en;q=0.9',
-        }
+        'noplaylist': True,  # watch?v=X&list=Y links download only X
     }
     
     try:
@@ -416,46 +449,46 @@ def generate_qr_code(data, job_id):
         print(f"QR Gen Error: {e}")
         return None
 
-# ============================================
-# ROUTES
-# ============================================
-@app.route('/health')
-def health_check():
-    return jsonify({'status': 'active', 'message': 'I am awake!'}), 200
-
-@app.route('/')
-def index():
-    return render_template('index.html')
+def expand_playlist(url):
+    """Returns the video URLs of a playlist, or [url] if it is a single video."""
+    ydl_opts = {
+        **YDL_BASE_OPTS,
+        'extract_flat': 'in_playlist',  # List entries without downloading them
+        # Stop listing once the batch limit is exceeded instead of walking huge channels
+        'playlistend': app.config['BATCH_MAX_VIDEOS'] + 1,
+    }
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+    except Exception as e:
+        raise Exception(f"Playlist Lookup Failed: {str(e)}")
+
+    if info.get('_type') != 'playlist':
+        return [url]
+
+    urls = []
+    for entry in info.get('entries') or []:
+        # Channel URLs list their tabs (Videos, Shorts, ...) as nested playlists
+        if not entry or entry.get('_type') == 'playlist' or entry.get('ie_key') == 'YoutubeTab':
+            continue
+        entry_url = entry.get('webpage_url') or entry.get('url')
+        if not entry_url and entry.get('id'):
+            entry_url = f"https://www.youtube.com/watch?v={entry['id']}"
+        if entry_url:
+            urls.append(entry_url)
+    return urls
+
+def process_video(job_id, video_path, filename, target_language, style, video_url=None):
+    """Runs the transcribe -> generate -> audit -> PDF pipeline for one video."""
+    conn = sqlite3.connect(DB_FILE, timeout=DB_WRITE_TIMEOUT)
+    c = conn.cursor()
+    c.execute("INSERT INTO jobs (id, filename, status) VALUES (?, ?, ?)", (job_id, filename, 'processing'))
+    conn.commit()
+    conn.close()
 
-@app.route('/upload', methods=['POST'])
-def upload_file():
-    # Check if URL provided
-    video_url = request.form.get('video_url')
-    file = request.files.get('video')
-    
-    if not video_url and not file:
-        return jsonify({'error': 'No video file or URL provided'}), 400
-    
-    target_language = request.form.get('language', 'English')
-    style = request.form.get('style', 'Professional (Corporate)')
-    
+    temp_files = []
+    clip = None
     try:
-        if video_url:
-            job_id, video_path, filename = download_from_url(video_url)
-        else:
-            job_id = str(uuid.uuid4())
-            filename = secure_filename(file.filename)
-            video_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_{filename}")
-            file.save(video_path)
-            
-        # Common Logic
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("INSERT INTO jobs (id, filename, status) VALUES (?, ?, ?)", (job_id, filename, 'processing'))
-        conn.commit()
-        conn.close()
-
-        temp_files = []
         auditor = AuditorSkill()
         
         # 0. Generate QR Code (if URL)
@@ -473,7 +506,8 @@ def upload_file():
         video_duration = clip.duration
         clip.audio.write_audiofile(audio_path, logger=None)
         
-        result = model.transcribe(audio_path, fp16=False)
+        with model_lock:
+            result = model.transcribe(audio_path, fp16=False)
         raw_text = result['text']
         
         # 2. Extract Screenshots (Every 10 seconds)
@@ -499,6 +533,7 @@ def upload_file():
                 print(f"Frame extraction failed at {ts}s: {e}")
             
         clip.close()
+        clip = None
         
         # Save Raw Transcript
         transcript_filename = f"{job_id}_transcript.txt"
@@ -622,23 +657,251 @@ def upload_file():
         output_filename = f"{job_id}.pdf"
         pdf.output(os.path.join(app.config['OUTPUT_FOLDER'], output_filename))
 
-        # Cleanup
+    except Exception:
+        # Don't let a locked database mask the pipeline error
+        try:
+            conn = sqlite3.connect(DB_FILE, timeout=DB_WRITE_TIMEOUT)
+            c = conn.cursor()
+            c.execute("UPDATE jobs SET status = ? WHERE id = ?", ('failed', job_id))
+            conn.commit()
+            conn.close()
+        except Exception as db_error:
+            print(f"Job {job_id} status update failed: {db_error}", flush=True)
+        raise
+
+    finally:
+        # Cleanup (also on failure, so a long batch doesn't fill uploads/)
+        if clip is not None:
+            clip.close()
         for t in temp_files:
             if os.path.exists(t): os.remove(t)
         if os.path.exists(video_path): os.remove(video_path)
 
+    conn = sqlite3.connect(DB_FILE, timeout=DB_WRITE_TIMEOUT)
+    c = conn.cursor()
+    c.execute("UPDATE jobs SET status = ? WHERE id = ?", ('completed', job_id))
+    conn.commit()
+    conn.close()
+
+    return {
+        'output_filename': output_filename,
+        'transcript_filename': transcript_filename,
+        'generated_text': generated_text,
+        'audit_status': audit['status']
+    }
+
+# Shared by all batches so BATCH_WORKERS caps downloads for the whole process
+batch_executor = ThreadPoolExecutor(max_workers=app.config['BATCH_WORKERS'])
+
+def update_batch_item(batch_id, position, **fields):
+    # Batch workers write concurrently; wait on the lock instead of the default 5s
+    conn = sqlite3.connect(DB_FILE, timeout=DB_WRITE_TIMEOUT)
+    c = conn.cursor()
+    columns = ", ".join(f"{k} = ?" for k in fields)
+    c.execute(f"UPDATE batch_items SET {columns} WHERE batch_id = ? AND position = ?",
+              (*fields.values(), batch_id, position))
+    conn.commit()
+    conn.close()
+
+def run_batch_item(batch_id, position, url, target_language, style):
+    """Downloads and processes one batch entry. Errors are recorded, not raised."""
+    try:
+        update_batch_item(batch_id, position, status='downloading')
+        job_id, video_path, filename = download_from_url(url)
+        update_batch_item(batch_id, position, job_id=job_id, status='processing')
+        # Downloads of other entries keep running while this one waits on the model lock
+        result = process_video(job_id, video_path, filename, target_language, style, url)
+        update_batch_item(batch_id, position, status='completed')
+        return result['output_filename']
+    except Exception as e:
+        print(f"Batch {batch_id} item {position} failed: {e}", flush=True)
+        try:
+            update_batch_item(batch_id, position, status='failed', error=str(e))
+        except Exception as db_error:
+            print(f"Batch {batch_id} item {position} status update failed: {db_error}", flush=True)
+        return None
+
+def run_batch(batch_id, urls, target_language, style):
+    """Processes a batch in the background and bundles the PDFs into a zip."""
+    status = 'failed'
+    error = None
+    try:
+        futures = [batch_executor.submit(run_batch_item, batch_id, i, url, target_language, style)
+                   for i, url in enumerate(urls)]
+        pdf_files = [f.result() for f in futures]
+
+        if any(pdf_files):
+            zip_path = os.path.join(app.config['OUTPUT_FOLDER'], f"{batch_id}.zip")
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+                for i, pdf_file in enumerate(pdf_files):
+                    if pdf_file:
+                        zf.write(os.path.join(app.config['OUTPUT_FOLDER'], pdf_file),
+                                 arcname=f"{i + 1:03d}_{pdf_file}")
+            status = 'completed'
+        else:
+            error = 'All videos failed'
+    except Exception as e:
+        print(f"Batch {batch_id} crashed: {e}", flush=True)
+        error = f"Batch Failed: {str(e)}"
+    finally:
+        # Always reach a final state, otherwise GET /batch/<id> polls forever
+        try:
+            conn = sqlite3.connect(DB_FILE, timeout=DB_WRITE_TIMEOUT)
+            c = conn.cursor()
+            c.execute("UPDATE batches SET status = ?, error = ? WHERE id = ?", (status, error, batch_id))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"Batch {batch_id} status update failed: {e}", flush=True)
+        print(f"Batch {batch_id} {status}", flush=True)
+
+# ============================================
+# ROUTES
+# ============================================
+@app.route('/health')
+def health_check():
+    return jsonify({'status': 'active', 'message': 'I am awake!'}), 200
+
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+@app.route('/upload', methods=['POST'])
+def upload_file():
+    # Check if URL provided
+    video_url = request.form.get('video_url')
+    file = request.files.get('video')
+    
+    if not video_url and not file:
+        return jsonify({'error': 'No video file or URL provided'}), 400
+    
+    target_language = request.form.get('language', 'English')
+    style = request.form.get('style', 'Professional (Corporate)')
+    
+    try:
+        if video_url:
+            job_id, video_path, filename = download_from_url(video_url)
+        else:
+            job_id = str(uuid.uuid4())
+            filename = secure_filename(file.filename)
+            video_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_{filename}")
+            file.save(video_path)
+            
+        result = process_video(job_id, video_path, filename, target_language, style, video_url)
+
         return jsonify({
             'message': 'Success',
-            'download_url': f'/download/{output_filename}',
-            'download_transcript_url': f'/download/{transcript_filename}',
-            'transcript_text': generated_text, # Sending FULL generated text for Chatbot context
-            'audit_status': audit['status']
+            'download_url': f'/download/{result["output_filename"]}',
+            'download_transcript_url': f'/download/{result["transcript_filename"]}',
+            'transcript_text': result['generated_text'], # Sending FULL generated text for Chatbot context
+            'audit_status': result['audit_status']
         })
 
     except Exception as e:
         print(f"Error: {e}", flush=True)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/batch', methods=['POST'])
+def submit_batch():
+    """Accepts a list of URLs or a single playlist URL and processes them in the background."""
+    data = request.get_json(silent=True)
+    if data is None:
+        # Form posts may repeat video_urls and/or put several URLs in one field
+        data = request.form
+        video_urls = [u for value in data.getlist('video_urls') for u in value.split()]
+    elif not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    else:
+        video_urls = data.get('video_urls') or []
+        if isinstance(video_urls, str):
+            video_urls = video_urls.split()
+
+    playlist_url = data.get('playlist_url')
+
+    if playlist_url is not None and not isinstance(playlist_url, str):
+        return jsonify({'error': 'playlist_url must be a string'}), 400
+    if not isinstance(video_urls, list) or not all(isinstance(u, str) and u.strip() for u in video_urls):
+        return jsonify({'error': 'video_urls must be a list of URLs'}), 400
+    video_urls = [u.strip() for u in video_urls]
+    playlist_url = playlist_url.strip() if playlist_url else None
+
+    if not playlist_url and not video_urls:
+        return jsonify({'error': 'No video URLs or playlist URL provided'}), 400
+
+    target_language = data.get('language', 'English')
+    style = data.get('style', 'Professional (Corporate)')
+    if not isinstance(target_language, str) or not isinstance(style, str):
+        return jsonify({'error': 'language and style must be strings'}), 400
+
+    try:
+        urls = expand_playlist(playlist_url) if playlist_url else list(video_urls)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not urls:
+        return jsonify({'error': 'Playlist contains no videos'}), 400
+    if len(urls) > app.config['BATCH_MAX_VIDEOS']:
+        return jsonify({'error': f"Batch is too large (Max {app.config['BATCH_MAX_VIDEOS']} videos)"}), 400
+
+    batch_id = str(uuid.uuid4())
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("INSERT INTO batches (id, status, total) VALUES (?, ?, ?)", (batch_id, 'processing', len(urls)))
+    c.executemany("INSERT INTO batch_items (batch_id, position, url, status) VALUES (?, ?, ?, ?)",
+                  [(batch_id, i, url, 'queued') for i, url in enumerate(urls)])
+    conn.commit()
+    conn.close()
+
+    threading.Thread(target=run_batch, args=(batch_id, urls, target_language, style), daemon=True).start()
+
+    return jsonify({
+        'batch_id': batch_id,
+        'total': len(urls),
+        'status_url': f'/batch/{batch_id}'
+    }), 202
+
+@app.route('/batch/<batch_id>')
+def batch_status(batch_id):
+    conn = sqlite3.connect(DB_FILE)
+    c = conn.cursor()
+    c.execute("SELECT status, total, error FROM batches WHERE id = ?", (batch_id,))
+    batch = c.fetchone()
+    c.execute("SELECT position, url, job_id, status, error FROM batch_items WHERE batch_id = ? ORDER BY position",
+              (batch_id,))
+    rows = c.fetchall()
+    conn.close()
+
+    if not batch:
+        return jsonify({'error': 'Batch not found'}), 404
+
+    status, total, batch_error = batch
+    items = []
+    for position, url, job_id, item_status, error in rows:
+        item = {'position': position, 'url': url, 'status': item_status}
+        if item_status == 'completed':
+            item['download_url'] = f'/download/{job_id}.pdf'
+            item['download_transcript_url'] = f'/download/{job_id}_transcript.txt'
+        if error:
+            item['error'] = error
+        items.append(item)
+
+    completed = sum(1 for i in items if i['status'] == 'completed')
+    failed = sum(1 for i in items if i['status'] == 'failed')
+    response = {
+        'batch_id': batch_id,
+        'status': status,
+        'total': total,
+        'completed': completed,
+        'failed': failed,
+        'progress': round(100 * (completed + failed) / total) if total else 100,
+        'items': items
+    }
+    if status == 'completed':
+        response['download_url'] = f'/download/{batch_id}.zip'
+    if batch_error:
+        response['error'] = batch_error
+    return jsonify(response)
+
 @app.route('/chat', methods=['POST'])
 def chat():
     data = request.get_json()